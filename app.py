@@ -1,144 +1,213 @@
 # app.py
 import streamlit as st
-import random, math, numpy as np
-import matplotlib.pyplot as plt
-from PIL import Image
+import math, functools, numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import PolyCollection
+from matplotlib.figure import Figure
+from numba import njit
 import io
 
-# --- Utility: Color brightness ---
+# --- Utility: Color brightness (works on (3,), (n,3) or (H,W,3) RGB arrays) ---
+_LUMA = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
 def luminance(rgb):
-    r, g, b = rgb
-    return 0.299*r + 0.587*g + 0.114*b
+    return np.asarray(rgb, dtype=np.float32) @ _LUMA
+
+def hex_to_rgb(s):
+    s = s.lstrip("#")
+    if len(s)==3:
+        s = "".join(c*2 for c in s)
+    b = bytes.fromhex(s)
+    return (b[0]/255, b[1]/255, b[2]/255)
+
+# --- Utility: Swap the title color if contrast is too low ---
+def readable_text_color(background, title_color):
+    bg_lum, text_lum = luminance((hex_to_rgb(background), hex_to_rgb(title_color)))
+    if abs(bg_lum-text_lum)<0.5:
+        return "#FFFFFF" if bg_lum<0.5 else "#000000"
+    return title_color
 
 # --- Color Palette ---
-def random_palette(style="pastel", k=20):
+def random_palette(style="pastel", k=20, rng=None):
+    rng = np.random.default_rng(rng)
     if style=="pastel":
-        colors = [(0.6+0.4*random.random(), 0.6+0.4*random.random(), 0.6+0.4*random.random()) for _ in range(k)]
+        colors = 0.6 + 0.4*rng.random((k,3))
     elif style=="neon":
-        colors = [(random.uniform(0.5,1), random.uniform(0,1), random.uniform(0.5,1)) for _ in range(k)]
+        colors = rng.uniform((0.5,0,0.5), (1,1,1), (k,3))
     elif style=="monochrome":
-        base = random.random()
-        colors = [(base+0.1*random.random(),)*3 for _ in range(k)]
+        base = rng.random()
+        colors = np.repeat(base + 0.1*rng.random((k,1)), 3, axis=1)
     elif style=="earth":
-        earth_tones = [
+        earth_tones = np.array([
             (0.42,0.26,0.15),(0.55,0.47,0.37),(0.62,0.74,0.55),
             (0.84,0.78,0.58),(0.40,0.55,0.30)
-        ]
-        colors = [random.choice(earth_tones) for _ in range(k)]
+        ], dtype=np.float32)
+        colors = earth_tones[rng.integers(0, len(earth_tones), k)]
     elif style=="ocean":
-        ocean_tones = [
+        ocean_tones = np.array([
             (0.0,0.3,0.5),(0.1,0.6,0.8),(0.2,0.8,0.9),
             (0.0,0.5,0.4),(0.4,0.9,1.0)
-        ]
-        colors = [random.choice(ocean_tones) for _ in range(k)]
+        ], dtype=np.float32)
+        colors = ocean_tones[rng.integers(0, len(ocean_tones), k)]
     elif style=="sunset":
-        sunset_tones = [
+        sunset_tones = np.array([
             (1.0,0.5,0.0),(1.0,0.2,0.3),(0.8,0.3,0.6),
             (0.6,0.2,0.8),(0.9,0.7,0.3)
-        ]
-        colors = [random.choice(sunset_tones) for _ in range(k)]
+        ], dtype=np.float32)
+        colors = sunset_tones[rng.integers(0, len(sunset_tones), k)]
     elif style=="cyberpunk":
-        cyber_colors = [
+        cyber_colors = np.array([
             (1.0,0.0,0.8),(0.0,1.0,1.0),(0.2,0.2,1.0),
             (1.0,0.8,0.1),(0.1,0.0,0.1)
-        ]
-        colors = [random.choice(cyber_colors) for _ in range(k)]
+        ], dtype=np.float32)
+        colors = cyber_colors[rng.integers(0, len(cyber_colors), k)]
     else:
-        colors = [(random.random(), random.random(), random.random()) for _ in range(k)]
-    return colors
+        colors = rng.random((k,3))
+    return np.asarray(colors, dtype=np.float32)
 
 # --- Shape Generators ---
-def blob(center=(0.5,0.5), r=0.2, points=1000, wobble=0.15):
+@functools.lru_cache(maxsize=8)
+def _ring(points):
     angles = np.linspace(0,2*math.pi,points)
-    radii = r*(1+wobble*(np.random.rand(points)-0.5))
-    x = center[0] + radii*np.cos(angles)
-    y = center[1] + radii*np.sin(angles)
-    return x, y
-
-def shape(center=(0.5,0.5), r=0.2, points=1000, wobble=0.15, shape_type="blob"):
-    if shape_type=="circle":
-        angles = np.linspace(0,2*np.pi,points)
-        x = center[0] + r*np.cos(angles)
-        y = center[1] + r*np.sin(angles)
-        return x, y
-    elif shape_type=="polygon":
-        global n_sides
-        n_sides = n_sides
-        angles = np.linspace(0,2*np.pi,n_sides,endpoint=False)
-        x = center[0] + r*np.cos(angles)
-        y = center[1] + r*np.sin(angles)
-        return np.append(x,x[0]), np.append(y,y[0])
+    cos_a, sin_a = np.cos(angles), np.sin(angles)
+    for a in (angles, cos_a, sin_a):
+        a.setflags(write=False)
+    return angles, cos_a, sin_a
+
+@functools.lru_cache(maxsize=8)
+def _poly_unit(n_sides):
+    # Closed loop: the first vertex is repeated at the end
+    angles = np.append(np.linspace(0,2*np.pi,n_sides,endpoint=False), 0)
+    cos_a, sin_a = np.cos(angles), np.sin(angles)
+    for a in (cos_a, sin_a):
+        a.setflags(write=False)
+    return cos_a, sin_a
+
+def outline(shape_type="blob", points=1000, n_sides=6):
+    if shape_type=="polygon":
+        return _poly_unit(n_sides)
+    _, cos_a, sin_a = _ring(points)
+    return cos_a, sin_a
+
+# --- Place, wobble and rotate every layer in one compiled pass ---
+@njit(fastmath=True, cache=True)
+def build_blobs(cx, cy, rr, angle, noise, cos_a, sin_a, out_x, out_y):
+    for i in range(cx.shape[0]):
+        c, s = math.cos(angle[i]), math.sin(angle[i])
+        for j in range(cos_a.shape[0]):
+            r = rr[i]*(1+noise[i,j])
+            dx, dy = r*cos_a[j], r*sin_a[j]
+            out_x[i,j] = cx[i] + dx*c - dy*s
+            out_y[i,j] = cy[i] + dx*s + dy*c
+
+# --- Layer geometry and colors (cached apart from background/text) ---
+# The cache is shared by every session; cap it (~2 MB per entry at 60 layers)
+@st.cache_data(max_entries=32, ttl=3600)
+def poster_layers(
+    style="pastel", shape_type="blob", n_sides=6, n_layers=30, wobble=0.03,
+    r_min=0.05, r_max=0.2, seed=None,
+    shadow_offset=0.02, brightness_strength=0.3,
+    alpha_min=0.6, alpha_max=0.9, light_angle=45,
+    rotation_range=0.3
+):
+    rng = np.random.default_rng(seed)
+
+    palette = random_palette(style, 20, rng)
+    dx = shadow_offset * math.cos(math.radians(light_angle))
+    dy = -shadow_offset * math.sin(math.radians(light_angle))
+
+    # Every per-layer draw in one call each, as (n_layers,) vectors
+    cx, cy = rng.random((2, n_layers))
+    # low + span*u rather than rng.uniform, which rejects reversed bounds
+    # (the min/max sliders are independent, so min > max is reachable)
+    rr = r_min + (r_max-r_min)*rng.random(n_layers)
+    angle = rng.uniform(-rotation_range, rotation_range, n_layers)
+    alpha = (alpha_min + (alpha_max-alpha_min)*rng.random(n_layers)).astype(np.float32)
+    palette_idx = rng.integers(0, len(palette), n_layers)
+
+    cos_a, sin_a = outline(shape_type, n_sides=n_sides)
+    if shape_type=="blob":
+        noise = wobble*(rng.random((n_layers, len(cos_a)))-0.5)
+        # The ring repeats angle 0 at 2π; share its noise so the outline closes without a seam
+        noise[:, -1] = noise[:, 0]
     else:
-        return blob(center,r,points,wobble)
+        noise = np.zeros((n_layers, len(cos_a)))
+    x, y = np.empty((2, n_layers, len(cos_a)))
+    build_blobs(cx, cy, rr, angle, noise, cos_a, sin_a, x, y)
+
+    # Shadow is the same rotated outline shifted away from the light
+    shapes = np.stack([x, y], axis=-1)
+    shadows = shapes + (dx, dy)
 
-# --- Rotate coordinates for 3D effect ---
-def rotate_coords(x, y, cx, cy, angle):
-    x_rot = (x-cx)*np.cos(angle) - (y-cy)*np.sin(angle) + cx
-    y_rot = (x-cx)*np.sin(angle) + (y-cy)*np.cos(angle) + cy
-    return x_rot, y_rot
+    base_colors = palette[palette_idx]
+    brightness = 0.7 + brightness_strength*(np.arange(n_layers, dtype=np.float32)/n_layers)
+    colors = np.column_stack([np.clip(base_colors*brightness[:,None],0,1), alpha])
+
+    # One collection, shadow and shape interleaved per layer to keep the stacking order
+    verts = np.stack([shadows, shapes], axis=1)
+    facecolors = np.stack([np.broadcast_to(np.float32((0,0,0,0.45)), colors.shape), colors], axis=1)
+    return verts.reshape(2*n_layers, -1, 2), facecolors.reshape(-1, 4)
 
 # --- 3D Poster Generator ---
 def generate_3d_poster(
-    style="pastel", shape_type="blob", n_layers=30, wobble=0.03,
-    background="#FFFFFF", title_color="#000000", seed=None,
+    style="pastel", shape_type="blob", n_sides=6, n_layers=30, wobble=0.03,
+    r_min=0.05, r_max=0.2, background="#FFFFFF", title_color="#000000", seed=None,
     shadow_offset=0.02, brightness_strength=0.3,
     alpha_min=0.6, alpha_max=0.9, light_angle=45,
     rotation_range=0.3
 ):
-    random.seed(seed)
-    np.random.seed(seed)
-    plt.close("all")
-    fig = plt.figure(figsize=(7,10), facecolor=background)
-    ax = plt.gca()
-    ax.axis("off")
+    verts, facecolors = poster_layers(
+        style=style, shape_type=shape_type, n_sides=n_sides, n_layers=n_layers, wobble=wobble,
+        r_min=r_min, r_max=r_max, seed=seed,
+        shadow_offset=shadow_offset, brightness_strength=brightness_strength,
+        alpha_min=alpha_min, alpha_max=alpha_max, light_angle=light_angle,
+        rotation_range=rotation_range
+    )
+
+    fig, ax = st.session_state.fig, st.session_state.ax
+    ax.cla()
+    fig.set_facecolor(background)
     ax.set_facecolor(background)
-
-    palette = random_palette(style, 20)
-    dx = shadow_offset * math.cos(math.radians(light_angle))
-    dy = -shadow_offset * math.sin(math.radians(light_angle))
-
-    global r_max, r_min
-    
-    for i in range(n_layers):
-        cx, cy = random.random(), random.random()
-        rr = random.uniform(r_min, r_max)
-        
-        # Shadow
-        x_s, y_s = shape(center=(cx+dx, cy+dy), r=rr, wobble=wobble, shape_type=shape_type)
-        angle = random.uniform(-rotation_range, rotation_range)
-        x_s, y_s = rotate_coords(x_s, y_s, cx+dx, cy+dy, angle)
-        plt.fill(x_s, y_s, color=(0,0,0), alpha=0.45, edgecolor=(0,0,0,0))
-
-        # Actual shape
-        x, y = shape(center=(cx,cy), r=rr, wobble=wobble, shape_type=shape_type)
-        x, y = rotate_coords(x, y, cx, cy, angle)
-        base_color = np.array(random.choice(palette))
-        brightness_factor = 0.7 + brightness_strength*(i/n_layers)
-        color = np.clip(base_color*brightness_factor,0,1)
-        alpha = random.uniform(alpha_min, alpha_max)
-        plt.fill(x, y, color=color, alpha=alpha, edgecolor=(0,0,0,0))
+    ax.axis("off")
+    ax.add_collection(PolyCollection(verts, facecolors=facecolors, edgecolors="none"))
 
     # Adjust text color if contrast is too low
-    bg_rgb = tuple(int(background.lstrip("#")[i:i+2],16)/255 for i in (0,2,4))
-    text_rgb = tuple(int(title_color.lstrip("#")[i:i+2],16)/255 for i in (0,2,4))
-    if abs(luminance(bg_rgb)-luminance(text_rgb))<0.5:
-        title_color="#FFFFFF" if luminance(bg_rgb)<0.5 else "#000000"
+    title_color = readable_text_color(background, title_color)
 
     # Text
-    plt.text(0.01,0.95,"3D like Generative Poster",fontsize=26,weight="bold",
-             color=title_color,transform=ax.transAxes,alpha=1.0)
-    plt.text(0.01,0.91,"Week 4 • Arts & Big Data",fontsize=14,
-             color=title_color,transform=ax.transAxes,alpha=1.0)
-    plt.text(0.01,0.88,f"Style: {style.title()} / Shape: {shape_type.title()}",fontsize=13,
-             color=title_color,transform=ax.transAxes,alpha=1.0)
-
-    plt.xlim(0,1)
-    plt.ylim(0,1)
+    ax.text(0.01,0.95,"3D like Generative Poster",fontsize=26,weight="bold",
+            color=title_color,transform=ax.transAxes,alpha=1.0)
+    ax.text(0.01,0.91,"Week 4 • Arts & Big Data",fontsize=14,
+            color=title_color,transform=ax.transAxes,alpha=1.0)
+    ax.text(0.01,0.88,f"Style: {style.title()} / Shape: {shape_type.title()}",fontsize=13,
+            color=title_color,transform=ax.transAxes,alpha=1.0)
+
+    ax.set_xlim(0,1)
+    ax.set_ylim(0,1)
     return fig
 
+# --- PNG render (cached on every parameter, including the text/background ones) ---
+# Capped like poster_layers (up to ~1.5 MB per entry at 300 dpi)
+@st.cache_data(max_entries=32, ttl=3600)
+def render_png(params, dpi):
+    fig = generate_3d_poster(**params)
+    fig.set_dpi(dpi)
+    buf = io.BytesIO()
+    # Fast zlib level: encode time matters more than a few extra KB
+    fig.canvas.print_png(buf, pil_kwargs={"compress_level": 1})
+    return buf.getvalue()
+
 # === Streamlit UI ===
 st.title("🎨 Generative 3D Poster")
 
+# One figure per session, cleared and redrawn on each render.
+# Same framing as the old bbox_inches="tight" crop of a 7x10 figure: the default
+# subplot axes (5.425 x 7.7 in) inside a 0.1 in background-colored pad
+if "fig" not in st.session_state:
+    fig = Figure(figsize=(5.625,7.9))
+    FigureCanvasAgg(fig)
+    st.session_state.fig, st.session_state.ax = fig, fig.add_axes((0.1/5.625, 0.1/7.9, 5.425/5.625, 7.7/7.9))
+
 style = st.sidebar.selectbox("Style", ['pastel','neon','monochrome','earth','ocean','sunset','cyberpunk'])
 shape_type = st.sidebar.selectbox("Shape Type", ['blob','circle','polygon'])
 n_sides = st.sidebar.slider("Polygon Sides", 3, 10, 6, 1)
@@ -156,19 +225,19 @@ alpha_min = st.sidebar.slider("Alpha Min", 0.1, 1.0, 0.6, 0.05)
 alpha_max = st.sidebar.slider("Alpha Max", 0.1, 1.0, 0.9, 0.05)
 light_angle = st.sidebar.slider("Light Angle", 0, 360, 45, 5)
 rotation_range = st.sidebar.slider("Rotation Range", 0.0, 1.0, 0.3, 0.05)
+dpi = st.sidebar.slider("Poster DPI", 100, 300, 150, 50)
 
-fig = generate_3d_poster(
-    style=style, shape_type=shape_type, n_layers=n_layers, wobble=wobble,
-    background=background, title_color=title_color, seed=seed,
+params = dict(
+    style=style, shape_type=shape_type, n_sides=n_sides, n_layers=n_layers, wobble=wobble,
+    r_min=r_min, r_max=r_max, background=background, title_color=title_color, seed=seed,
     shadow_offset=shadow_offset, brightness_strength=brightness_strength,
     alpha_min=alpha_min, alpha_max=alpha_max, light_angle=light_angle,
     rotation_range=rotation_range
 )
 
-st.pyplot(fig)
+# One cached encode serves both the preview and the download
+png_bytes = render_png(params, dpi)
+st.image(png_bytes, width="stretch")
 
 # Download
-buf = io.BytesIO()
-fig.savefig(buf, format="png", dpi=300, bbox_inches="tight", facecolor=background)
-buf.seek(0)
-st.download_button("💾 Download Poster", data=buf, file_name=f"poster_seed{seed}.png", mime="image/png")
+st.download_button("💾 Download Poster", data=png_bytes, file_name=f"poster_seed{seed}.png", mime="image/png")